@@ -1,16 +1,37 @@
 import os
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timezone as dt_timezone
 
 from django import forms
 from django.contrib import admin, messages
+from django.contrib.admin.views.main import ChangeList
+from django.core.cache import cache
+from django.core.paginator import Paginator
+from django.db import connections
+from django.db.models import (
+    BooleanField,
+    Case,
+    Count,
+    DateField,
+    DurationField,
+    ExpressionWrapper,
+    Q,
+    Value,
+    When,
+)
+from django.db.models.functions import TruncDate
 from django.forms.widgets import FileInput
 from django.shortcuts import redirect, render
 from django.urls import path, reverse
 from django.utils import timezone
+from django.utils.functional import cached_property
 from django.utils.html import format_html
+from django.utils.http import urlencode
 from django.utils.safestring import mark_safe
 from simple_history.admin import SimpleHistoryAdmin
 
 from .models import (
+    RESUMO_CACHE_KEY,
     AnexoDemanda,
     Contato,
     Demanda,
@@ -20,6 +41,80 @@ from .models import (
     TipoAtividade,
 )
 
+# Id improvável usado para resolver uma URL uma única vez e depois trocar
+# o id por um marcador "%d"
+_ID_SENTINELA = 987654321
+
+
+def _molde_url(viewname, nargs=1):
+    """
+    Resolve a URL com ids sentinela e devolve um molde para uso com ``%``.
+    """
+    args = [_ID_SENTINELA + i for i in range(nargs)]
+    url = reverse(viewname, args=args).replace("%", "%%")
+    for arg in args:
+        url = url.replace(str(arg), "%d")
+    return url
+
+
+# Moldes HTML das colunas do changelist de Demanda, montados uma única vez
+_STATUS_TAG_HTML = (
+    '<span style="background: {}; color: white; padding: 3px 10px; '
+    'border-radius: 12px; font-weight: bold; font-size: 11px;">{}</span>'
+)
+_PRAZO_TAG_HTML = '<strong style="color: {};">{}</strong>'
+_BOTAO_SUB_HTML = (
+    '<a class="btn" href="{}" style="background:#17a2b8; color:white; padding:2px 5px; '
+    'font-size:10px; margin-right:3px; border-radius:3px; text-decoration:none;">+ Sub</a>'
+)
+_BOTAO_ASSUMIR_HTML = (
+    '<a class="btn" href="{}" style="background:#28a745; color:white; padding:2px 5px; '
+    'font-size:10px; margin-right:3px; border-radius:3px; text-decoration:none;">Assumir</a>'
+)
+_LINK_STATUS_PEND_HTML = (
+    '<a href="{}" '
+    "onclick=\"window.open(this.href, 'popup', 'width=600,height=500,scrollbars=yes,resizable=yes'); return false;\" "
+    'style="font-size:10px; padding:1px 4px; border:1px solid #ffc107; color:#856404; '
+    'background:#fff3cd; text-decoration:none; margin-right:2px;">'
+    "{}</a>"
+)
+_LINK_STATUS_HTML = (
+    '<a href="{}" style="font-size:10px; padding:1px 4px; border:1px solid #ccc; '
+    'color:#666; text-decoration:none; margin-right:2px;">'
+    "{}</a>"
+)
+
+
+def _gravar_arquivos(anexos, max_workers=6):
+    """
+    Envia ao storage, em paralelo, os arquivos ainda não gravados dos anexos.
+    As linhas no banco continuam sendo salvas por quem chamou.
+    """
+
+    def gravar(anexo):
+        anexo.arquivo.save(anexo.arquivo.name, anexo.arquivo.file, save=False)
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        list(executor.map(gravar, anexos))
+
+
+# Moldes HTML dos anexos (inline de Demanda e changelist de anexos)
+_LINK_DOWNLOAD_HTML = (
+    '<a href="{}" target="_blank" title="{}" style="'
+    "background-color: #17a2b8; color: white; padding: 4px 10px; "
+    "border-radius: 4px; text-decoration: none; font-size: 10px; "
+    'font-weight: bold; display: inline-block; min-width: 80px; text-align: center;">'
+    "📄 {}</a>"
+)
+_BOTAO_BAIXAR_HTML = (
+    '<a class="button" href="{}" target="_blank" style="'
+    "background-color: #28a745; color: white; padding: 5px 15px; "
+    "border-radius: 20px; text-decoration: none; font-weight: bold; "
+    'box-shadow: 0 2px 4px rgba(0,0,0,0.1); border: none;">'
+    "📥 DOWNLOAD</a>"
+)
+_LINK_DEMANDA_HTML = '<a href="{}">{}</a>'
+
 
 class MultipleFileInput(FileInput):
     """
@@ -51,19 +146,10 @@ class AnexoDemandaInline(admin.TabularInline):
 
     def link_download(self, obj):
         if obj.id and obj.arquivo:
-            import os
-
             nome = os.path.basename(obj.arquivo.name)
             nome_exibicao = (nome[:17] + "..") if len(nome) > 20 else nome
             return format_html(
-                '<a href="{}" target="_blank" title="{}" style="'
-                "background-color: #17a2b8; color: white; padding: 4px 10px; "
-                "border-radius: 4px; text-decoration: none; font-size: 10px; "
-                'font-weight: bold; display: inline-block; min-width: 80px; text-align: center;">'
-                "📄 {}</a>",
-                obj.arquivo.url,
-                nome,
-                nome_exibicao,
+                _LINK_DOWNLOAD_HTML, obj.arquivo.url, nome, nome_exibicao
             )
         return "-"
 
@@ -83,11 +169,9 @@ class DemandaForm(forms.ModelForm):
         cleaned = super().clean()
         situacao = cleaned.get("situacao")
         desc = cleaned.get("pendencia_descricao")
-        if situacao and situacao.nome and "pend" in situacao.nome.lower():
-            old = getattr(self.instance, "situacao", None)
-            old_id = old.pk if old else None
-            new_id = situacao.pk
-            if old_id != new_id and not desc:
+        if situacao and situacao.pendente:
+            # Compara pela coluna, sem carregar a situação anterior do banco
+            if self.instance.situacao_id != situacao.pk and not desc:
                 raise forms.ValidationError(
                     {
                         "pendencia_descricao": "Descrição da pendência é obrigatória ao marcar como pendente."
@@ -96,7 +180,32 @@ class DemandaForm(forms.ModelForm):
         return cleaned
 
 
-class SubitemInline(admin.TabularInline):
+class CachedChoicesMixin:
+    """
+    Avalia uma única vez por requisição as opções dos selects de chave
+    estrangeira, reaproveitando-as entre o form principal e cada linha dos
+    inlines.
+    """
+
+    cached_choices_fields = ("situacao", "tema", "tipo", "responsavel")
+
+    def formfield_for_foreignkey(self, db_field, request, **kwargs):
+        formfield = super().formfield_for_foreignkey(db_field, request, **kwargs)
+        if (
+            formfield is None
+            or db_field.name not in self.cached_choices_fields
+            or db_field.name in self.get_autocomplete_fields(request)
+        ):
+            return formfield
+        cache = request.__dict__.setdefault("_choices_cache", {})
+        if db_field.related_model not in cache:
+            # iter() evita o COUNT(*) que list() dispararia via __len__
+            cache[db_field.related_model] = list(iter(formfield.choices))
+        formfield.choices = cache[db_field.related_model]
+        return formfield
+
+
+class SubitemInline(CachedChoicesMixin, admin.TabularInline):
     model = Demanda
     extra = 0
     fields = ["tema", "titulo", "situacao", "responsavel", "data_prazo"]
@@ -111,37 +220,149 @@ class PendenciaInline(admin.TabularInline):
     readonly_fields = ("descricao", "criado_em", "dias_pendente")
     can_delete = False
 
+    def get_queryset(self, request):
+        # Dias pendentes calculados no banco: da criação até a resolução,
+        # ou até hoje se ainda estiver aberta (datas em UTC, como no Python)
+        fim = Case(
+            When(
+                resolvida=True,
+                resolvido_em__isnull=False,
+                then=TruncDate("resolvido_em", tzinfo=dt_timezone.utc),
+            ),
+            default=Value(timezone.now().date()),
+            output_field=DateField(),
+        )
+        return (
+            super()
+            .get_queryset(request)
+            .annotate(
+                _dias=ExpressionWrapper(
+                    fim - TruncDate("criado_em", tzinfo=dt_timezone.utc),
+                    output_field=DurationField(),
+                )
+            )
+        )
+
     def dias_pendente(self, obj):
-        if not obj.criado_em:
+        dias = getattr(obj, "_dias", None)
+        if dias is None:
             return "-"
-        fim = (
-            obj.resolvido_em.date()
-            if (obj.resolvida and obj.resolvido_em)
-            else timezone.now().date()
+        return f"{dias.days} dias"
+
+
+class EstimatedCountPaginator(Paginator):
+    """
+    Paginador que, no PostgreSQL e sem filtros aplicados, usa a estimativa de
+    linhas do catálogo no lugar de um COUNT(*) na tabela inteira.
+    """
+
+    # Abaixo disso a estimativa não compensa e o COUNT(*) exato é barato
+    limite_estimativa = 10000
+
+    @cached_property
+    def count(self):
+        qs = self.object_list
+        conexao = connections[qs.db]
+        if conexao.vendor != "postgresql" or qs.query.where:
+            return super().count
+        with conexao.cursor() as cursor:
+            cursor.execute(
+                "SELECT reltuples::bigint FROM pg_class WHERE relname = %s",
+                [qs.model._meta.db_table],
+            )
+            linha = cursor.fetchone()
+        if not linha or linha[0] < self.limite_estimativa:
+            return super().count
+        return linha[0]
+
+
+class _AcoesDaPagina:
+    """
+    Estado das ações rápidas de uma página da listagem: usuário logado,
+    ``next`` para voltar à mesma página e próximas situações por situação.
+    """
+
+    def __init__(self, request):
+        self.usuario_id = request.user.id
+        self.status_next = "?" + urlencode({"next": request.get_full_path()})
+        self._proximas = {}
+
+    def proximas(self, situacao):
+        proximas = self._proximas.get(situacao.pk)
+        if proximas is None:
+            proximas = self._proximas[situacao.pk] = [
+                (
+                    proxima.id,
+                    proxima.nome,
+                    _LINK_STATUS_PEND_HTML if proxima.pendente else _LINK_STATUS_HTML,
+                )
+                for proxima in situacao.proximas_situacoes.all()
+            ]
+        return proximas
+
+
+class DemandaChangeList(ChangeList):
+    """
+    Listagem de demandas sem carregar os campos de texto longos, que não
+    aparecem em nenhuma coluna, com o atraso do prazo calculado no banco e
+    as relações exibidas (e as próximas situações das ações rápidas)
+    carregadas junto.
+    """
+
+    def get_queryset(self, request, exclude_parameters=None):
+        qs = super().get_queryset(request, exclude_parameters)
+        # Em aberto: prazo antes de hoje; fechada: prazo antes do fechamento
+        # (datas em UTC, como no cálculo anterior em Python)
+        atrasado = Case(
+            When(
+                data_fechamento__isnull=True,
+                data_prazo__lt=timezone.now().date(),
+                then=Value(True),
+            ),
+            When(
+                data_fechamento__isnull=False,
+                data_prazo__lt=TruncDate("data_fechamento", tzinfo=dt_timezone.utc),
+                then=Value(True),
+            ),
+            default=Value(False),
+            output_field=BooleanField(),
         )
-        delta = fim - obj.criado_em.date()
-        return f"{delta.days} dias"
+        return (
+            qs.select_related("situacao", "responsavel", "tema")
+            .defer("descricao", "observacao")
+            .annotate(_atrasado=atrasado)
+            # Próximas situações usadas só pelas ações rápidas da listagem
+            .prefetch_related("situacao__proximas_situacoes")
+        )
+
+    def get_results(self, request):
+        super().get_results(request)
+        # O ModelAdmin é compartilhado entre requisições (e threads), então o
+        # estado das ações rápidas vai em cada linha desta página
+        acoes = _AcoesDaPagina(request)
+        for obj in self.result_list:
+            obj._acoes = acoes
 
 
 @admin.register(AnexoDemanda)
 class AnexoDemandaAdmin(admin.ModelAdmin):
     list_display = ("id", "demanda_link", "nome_arquivo", "data_upload", "baixar")
+    list_select_related = ("demanda",)
+    list_per_page = 25
+    list_max_show_all = 200
+    show_full_result_count = False
+    paginator = EstimatedCountPaginator
 
     def baixar(self, obj):
-        return format_html(
-            '<a class="button" href="{}" target="_blank" style="'
-            "background-color: #28a745; color: white; padding: 5px 15px; "
-            "border-radius: 20px; text-decoration: none; font-weight: bold; "
-            'box-shadow: 0 2px 4px rgba(0,0,0,0.1); border: none;">'
-            "📥 DOWNLOAD</a>",
-            obj.arquivo.url,
-        )
+        return format_html(_BOTAO_BAIXAR_HTML, obj.arquivo.url)
+
+    @cached_property
+    def _url_demanda(self):
+        return _molde_url("admin:core_demanda_change")
 
     def demanda_link(self, obj):
         return format_html(
-            '<a href="{}">{}</a>',
-            reverse("admin:core_demanda_change", args=[obj.demanda.id]),
-            obj.demanda.titulo,
+            _LINK_DEMANDA_HTML, self._url_demanda % obj.demanda_id, obj.demanda.titulo
         )
 
     def nome_arquivo(self, obj):
@@ -155,7 +376,7 @@ class ContatoAdmin(admin.ModelAdmin):
 
 
 @admin.register(Demanda)
-class DemandaAdmin(SimpleHistoryAdmin):
+class DemandaAdmin(CachedChoicesMixin, SimpleHistoryAdmin):
     form = DemandaForm
     inlines = [SubitemInline, PendenciaInline, AnexoDemandaInline]
     list_display = (
@@ -166,7 +387,12 @@ class DemandaAdmin(SimpleHistoryAdmin):
         "responsavel",
         "acoes_rapidas",
     )
-    list_filter = ("tema", "situacao", "responsavel", "tema")
+    list_per_page = 25
+    list_max_show_all = 200
+    ordering = ("-criado_em",)
+    show_full_result_count = False
+    paginator = EstimatedCountPaginator
+    list_filter = ("tema", "situacao", "responsavel")
     search_fields = ("titulo", "descricao")
     autocomplete_fields = ["parent", "responsavel", "solicitantes"]
     readonly_fields = ["data_fechamento"]
@@ -185,11 +411,7 @@ class DemandaAdmin(SimpleHistoryAdmin):
     def status_tag(self, obj):
         if not obj.situacao:
             return "-"
-        return format_html(
-            '<span style="background: {}; color: white; padding: 3px 10px; border-radius: 12px; font-weight: bold; font-size: 11px;">{}</span>',
-            obj.situacao.cor_hex,
-            obj.situacao.nome,
-        )
+        return format_html(_STATUS_TAG_HTML, obj.situacao.cor_hex, obj.situacao.nome)
 
     status_tag.admin_order_field = "situacao__nome"
     status_tag.short_description = "Bucket"
@@ -197,11 +419,7 @@ class DemandaAdmin(SimpleHistoryAdmin):
     def status_prazo_tag(self, obj):
         if not obj.data_prazo:
             return "-"
-        atrasado = (
-            obj.data_prazo < timezone.now().date()
-            if obj.data_fechamento is None
-            else obj.data_prazo < obj.data_fechamento.date()
-        )
+        atrasado = obj._atrasado
         cor = (
             "#e74c3c"
             if atrasado
@@ -220,69 +438,44 @@ class DemandaAdmin(SimpleHistoryAdmin):
                 )
             )
         )
-        return format_html('<strong style="color: {};">{}</strong>', cor, txt)
+        return format_html(_PRAZO_TAG_HTML, cor, txt)
 
     status_prazo_tag.admin_order_field = "data_prazo"
     status_prazo_tag.short_description = "Status do Prazo"
 
-    def changelist_view(self, request, extra_context=None):
-        # Guardamos o request atual para usar no método acoes_rapidas
-        self._current_request = request
-        return super().changelist_view(request, extra_context)
+    def get_changelist(self, request, **kwargs):
+        return DemandaChangeList
 
-    def acoes_rapidas(self, obj):
-        # Recuperamos o ID do usuário diretamente do request que salvamos
-        usuario_logado = self._current_request.user if self._current_request else None
-        id_do_usuario = usuario_logado.id if usuario_logado else None
+    # Moldes das URLs de ação: resolvidos uma vez por processo, não por linha
+    @cached_property
+    def _url_sub(self):
+        return _molde_url("criar_subatividade")
+
+    @cached_property
+    def _url_assumir(self):
+        return _molde_url("admin:core_demanda_assumir")
 
+    @cached_property
+    def _url_status(self):
+        return _molde_url("alterar_status", 2)
+
+    def acoes_rapidas(self, obj):
+        acoes = obj._acoes
         html = []
 
         # Botão + Sub
-        html.append(
-            format_html(
-                '<a class="btn" href="{}" style="background:#17a2b8; color:white; padding:2px 5px; font-size:10px; margin-right:3px; border-radius:3px; text-decoration:none;">+ Sub</a>',
-                reverse("criar_subatividade", args=[obj.pk]),
-            )
-        )
+        html.append(format_html(_BOTAO_SUB_HTML, self._url_sub % obj.pk))
 
         # Botão Assumir (Aparece apenas se o logado NÃO for o responsável)
-        if obj.responsavel_id != id_do_usuario:
-            assumir_url = reverse(
-                f"admin:{obj._meta.app_label}_{obj._meta.model_name}_assumir",
-                args=[obj.pk],
-            )
-            html.append(
-                format_html(
-                    '<a class="btn" href="{}" style="background:#28a745; color:white; padding:2px 5px; font-size:10px; margin-right:3px; border-radius:3px; text-decoration:none;">Assumir</a>',
-                    assumir_url,
-                )
-            )
+        if obj.responsavel_id != acoes.usuario_id:
+            assumir_url = self._url_assumir % obj.pk
+            html.append(format_html(_BOTAO_ASSUMIR_HTML, assumir_url))
 
         # Status seguintes
         if obj.situacao:
-            for proxima in obj.situacao.proximas_situacoes.all():
-                url = reverse("alterar_status", args=[obj.pk, proxima.id])
-
-                if "pend" in proxima.nome.lower():
-                    html.append(
-                        format_html(
-                            '<a href="{}" '
-                            "onclick=\"window.open(this.href, 'popup', 'width=600,height=500,scrollbars=yes,resizable=yes'); return false;\" "
-                            'style="font-size:10px; padding:1px 4px; border:1px solid #ffc107; color:#856404; background:#fff3cd; text-decoration:none; margin-right:2px;">'
-                            "{}</a>",
-                            url,
-                            proxima.nome,
-                        )
-                    )
-                else:
-                    html.append(
-                        format_html(
-                            '<a href="{}" style="font-size:10px; padding:1px 4px; border:1px solid #ccc; color:#666; text-decoration:none; margin-right:2px;">'
-                            "{}</a>",
-                            url,
-                            proxima.nome,
-                        )
-                    )
+            for proxima_id, nome, molde in acoes.proximas(obj.situacao):
+                url = self._url_status % (obj.pk, proxima_id) + acoes.status_next
+                html.append(format_html(molde, url, nome))
         return mark_safe("".join(html))
 
     acoes_rapidas.short_description = "Ações"
@@ -304,15 +497,26 @@ class DemandaAdmin(SimpleHistoryAdmin):
     def assumir_demanda(self, request, pk):
         obj = self.get_object(request, pk)
         if obj:
-            obj.responsavel = request.user
-            obj.save()
+            if obj.responsavel_id != request.user.id:
+                obj.responsavel = request.user
+                obj.save(update_fields=["responsavel", "atualizado_em"])
             self.message_user(
                 request, f"Você assumiu a demanda: {obj.titulo}", messages.SUCCESS
             )
         return redirect(reverse("admin:core_demanda_changelist"))
 
     def admin_dashboard(self, request):
-        return render(request, "admin/core/demanda_dashboard.html")
+        resumo = cache.get(RESUMO_CACHE_KEY)
+        if resumo is None:
+            hoje = timezone.now().date()
+            abertas = Q(data_fechamento__isnull=True)
+            resumo = Demanda.objects.aggregate(
+                total=Count("id"),
+                abertas=Count("id", filter=abertas),
+                atrasadas=Count("id", filter=abertas & Q(data_prazo__lt=hoje)),
+            )
+            cache.set(RESUMO_CACHE_KEY, resumo, 60)
+        return render(request, "admin/core/demanda_dashboard.html", {"resumo": resumo})
 
     def save_model(self, request, obj, form, change):
         super().save_model(request, obj, form, change)
@@ -329,11 +533,23 @@ class DemandaAdmin(SimpleHistoryAdmin):
             for obj in formset.deleted_objects:
                 obj.delete()
 
+            # Agrupa os arquivos enviados pelo índice do form em uma só passada
+            prefixo, sufixo = f"{formset.prefix}-", "-arquivo"
+            arquivos_por_form = {}
+            for chave, arquivos in request.FILES.lists():
+                if chave.startswith(prefixo) and chave.endswith(sufixo):
+                    indice = chave[len(prefixo) : -len(sufixo)]
+                    if indice.isdigit():
+                        arquivos_por_form[int(indice)] = arquivos
+
+            # O primeiro arquivo de cada campo vai para o anexo do form; os
+            # demais viram anexos novos, gravados num único INSERT ao final
+            anexos_do_form, novos_anexos = [], []
             for i, inline_form in enumerate(formset.forms):
                 if inline_form in formset.deleted_forms:
                     continue
 
-                files = request.FILES.getlist(f"{formset.prefix}-{i}-arquivo")
+                files = arquivos_por_form.get(i)
 
                 if files:
                     instance = inline_form.instance
@@ -341,18 +557,27 @@ class DemandaAdmin(SimpleHistoryAdmin):
                         instance.demanda = form.instance
 
                     instance.arquivo = files[0]
-                    instance.save()
-                    if instance not in formset.new_objects:
-                        formset.new_objects.append(instance)
-
-                    for f in files[1:]:
-                        novo_anexo = AnexoDemanda.objects.create(
-                            demanda=form.instance, arquivo=f
-                        )
-                        formset.new_objects.append(novo_anexo)
+                    anexos_do_form.append(instance)
+                    novos_anexos.extend(
+                        AnexoDemanda(demanda=form.instance, arquivo=f)
+                        for f in files[1:]
+                    )
                 else:
                     if inline_form.instance.pk and inline_form.has_changed():
                         inline_form.save()
+
+            if anexos_do_form:
+                _gravar_arquivos(anexos_do_form + novos_anexos)
+
+            for instance in anexos_do_form:
+                instance.save()
+                if instance not in formset.new_objects:
+                    formset.new_objects.append(instance)
+
+            if novos_anexos:
+                formset.new_objects.extend(
+                    AnexoDemanda.objects.bulk_create(novos_anexos)
+                )
         else:
             super().save_formset(request, form, formset, change)
 
@@ -375,5 +600,5 @@ class SituacaoForm(forms.ModelForm):
 @admin.register(Situacao)
 class SituacaoAdmin(admin.ModelAdmin):
     form = SituacaoForm
-    list_display = ("nome", "padrao", "pendente")
+    list_display = ("nome", "padrao", "pendente", "execucao")
     search_fields = ["nome"]
@@ -0,0 +1,37 @@
+import hmac
+
+from django.shortcuts import redirect, render
+
+SENHA_MESTRE = "hub123"
+
+
+class DashboardAuthMiddleware:
+    """
+    Protege o dashboard com a senha mestre antes de chegar na view.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        return self.get_response(request)
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        if request.resolver_match.url_name != "dashboard":
+            return None
+
+        if "logout" in request.GET:
+            request.session["auth_dashboard"] = False
+            return redirect("dashboard")
+        if request.method == "POST":
+            senha = request.POST.get("password", "")
+            if hmac.compare_digest(senha.encode(), SENHA_MESTRE.encode()):
+                request.session["auth_dashboard"] = True
+            else:
+                return render(
+                    request, "core/login_dashboard.html", {"error": "Senha incorreta!"}
+                )
+
+        if not request.session.get("auth_dashboard"):
+            return render(request, "core/login_dashboard.html")
+        return None
@@ -0,0 +1,21 @@
+# Generated by Django 6.1.2 on 2026-10-15 21:50
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("core", "0015_alter_situacao_options_remove_demanda_nivel_and_more"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="demanda",
+            index=models.Index(
+                fields=["responsavel", "situacao"], name="demanda_resp_sit_idx"
+            ),
+        ),
+    ]
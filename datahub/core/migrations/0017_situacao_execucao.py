@@ -0,0 +1,30 @@
+# Generated by Django 6.1.2 on 2026-10-15 21:50
+
+from django.db import migrations, models
+
+
+def marcar_flags_pelo_nome(apps, schema_editor):
+    # Os sinais casavam a situação pelo nome; preserva esse comportamento
+    # marcando as flags das situações existentes
+    Situacao = apps.get_model("core", "Situacao")
+    Situacao.objects.filter(nome__icontains="exec").update(execucao=True)
+    Situacao.objects.filter(nome__icontains="pend").update(pendente=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("core", "0016_demanda_demanda_resp_sit_idx"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="situacao",
+            name="execucao",
+            field=models.BooleanField(
+                default=False,
+                help_text="Marcar como situação que representa 'em execução'",
+            ),
+        ),
+        migrations.RunPython(marcar_flags_pelo_nome, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 6.1.2 on 2026-10-15 21:54
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("core", "0017_situacao_execucao"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="demanda",
+            index=models.Index(fields=["-criado_em"], name="demanda_criado_idx"),
+        ),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 6.1.2 on 2026-10-15 21:59
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("core", "0018_demanda_demanda_criado_idx"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="demanda",
+            index=models.Index(
+                fields=["situacao", "-criado_em"], name="demanda_sit_criado_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="demanda",
+            index=models.Index(fields=["data_prazo"], name="demanda_prazo_idx"),
+        ),
+        migrations.AddIndex(
+            model_name="demanda",
+            index=models.Index(
+                fields=["responsavel", "-criado_em"], name="demanda_resp_criado_idx"
+            ),
+        ),
+    ]
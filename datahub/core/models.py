@@ -1,8 +1,10 @@
 import os
+from contextlib import nullcontext
 
 from django.contrib.auth.models import User
-from django.db import models
-from django.db.models.signals import post_save, pre_save
+from django.core.cache import cache
+from django.db import models, transaction
+from django.db.models.signals import post_delete, post_save, pre_save
 from django.dispatch import receiver
 from django.utils import timezone
 from simple_history.models import HistoricalRecords
@@ -37,6 +39,10 @@ class Situacao(models.Model):
         default=False,
         help_text="Marcar como situação que representa 'pendente'",
     )
+    execucao = models.BooleanField(
+        default=False,
+        help_text="Marcar como situação que representa 'em execução'",
+    )
     proximas_situacoes = models.ManyToManyField("self", symmetrical=False, blank=True)
 
     class Meta:
@@ -96,12 +102,31 @@ class Demanda(models.Model):
     atualizado_em = models.DateTimeField(auto_now=True)
     history = HistoricalRecords()
 
+    class Meta:
+        indexes = [
+            # Filtros combinados do changelist (responsável + situação)
+            models.Index(
+                fields=["responsavel", "situacao"], name="demanda_resp_sit_idx"
+            ),
+            # Ordenação padrão do changelist; declarado aqui (e não com
+            # db_index) para o simple_history não copiar para o histórico
+            models.Index(fields=["-criado_em"], name="demanda_criado_idx"),
+            # Kanban (por situação), filtro de prazo e "minhas demandas"
+            models.Index(
+                fields=["situacao", "-criado_em"], name="demanda_sit_criado_idx"
+            ),
+            models.Index(fields=["data_prazo"], name="demanda_prazo_idx"),
+            models.Index(
+                fields=["responsavel", "-criado_em"], name="demanda_resp_criado_idx"
+            ),
+        ]
+
     def __str__(self):
         return f"{self.tema}: {self.titulo}"
 
 
 def upload_anexo_path(instance, filename):
-    return os.path.join("anexos", f"demanda_{instance.demanda.id}", filename)
+    return os.path.join("anexos", f"demanda_{instance.demanda_id}", filename)
 
 
 class AnexoDemanda(models.Model):
@@ -138,38 +163,121 @@ class Pendencia(models.Model):
         related_name="pendencias_resolvidas",
     )
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Guarda o valor carregado para o pre_save não precisar reler a linha
+        if "resolvida" in instance.__dict__:
+            instance._loaded_resolvida = instance.resolvida
+        return instance
+
+    def refresh_from_db(self, using=None, fields=None, from_queryset=None):
+        super().refresh_from_db(using, fields, from_queryset)
+        # Só acompanha o valor do banco se resolvida foi de fato relida
+        recarregada = fields is None or "resolvida" in fields
+        if recarregada and "resolvida" in self.__dict__:
+            self._loaded_resolvida = self.resolvida
+
     def __str__(self):
         return f"Pendência em {self.demanda.titulo}"
 
 
+# Ids das situações buscadas pelos sinais, por flag. O cache é limpo sempre
+# que uma situação é salva ou removida.
+_SITUACAO_CACHE = {}
+
+
+def _situacao_pk(flag):
+    if flag not in _SITUACAO_CACHE:
+        _SITUACAO_CACHE[flag] = (
+            Situacao.objects.filter(**{flag: True}).values_list("pk", flat=True).first()
+        )
+    return _SITUACAO_CACHE[flag]
+
+
+@receiver([post_save, post_delete], sender=Situacao)
+def situacao_changed(sender, **kwargs):
+    _SITUACAO_CACHE.clear()
+
+
 @receiver(pre_save, sender=Pendencia)
 def pendencia_pre_save(sender, instance, **kwargs):
-    if instance.pk:
-        try:
-            old = Pendencia.objects.get(pk=instance.pk)
-            instance._was_resolvida = bool(old.resolvida)
-        except Pendencia.DoesNotExist:
-            instance._was_resolvida = False
-    else:
-        instance._was_resolvida = False
+    was = False
+    if hasattr(instance, "_loaded_resolvida"):
+        was = instance._loaded_resolvida
+    elif instance.pk:
+        was = bool(
+            Pendencia.objects.filter(pk=instance.pk)
+            .values_list("resolvida", flat=True)
+            .first()
+        )
+    instance._was_resolvida = was
+    # resolvido_em é ajustado na própria linha que está sendo gravada
+    now = bool(instance.resolvida)
+    if not was and now and not instance.resolvido_em:
+        instance.resolvido_em = timezone.now()
+    elif was and not now:
+        instance.resolvido_em = None
 
 
 @receiver(post_save, sender=Pendencia)
-def pendencia_post_save(sender, instance, created, **kwargs):
+def pendencia_post_save(sender, instance, created, update_fields=None, **kwargs):
     was = getattr(instance, "_was_resolvida", False)
     now = bool(instance.resolvida)
-    if not was and now:
-        if not instance.resolvido_em:
-            Pendencia.objects.filter(pk=instance.pk).update(resolvido_em=timezone.now())
-        exec_sit = Situacao.objects.filter(nome__icontains="exec").first()
-        if exec_sit:
-            Demanda.objects.filter(pk=instance.demanda_id).update(
-                situacao_id=exec_sit.pk, data_fechamento=None
-            )
-    if was and not now:
-        Pendencia.objects.filter(pk=instance.pk).update(resolvido_em=None)
-        pend_sit = Situacao.objects.filter(nome__icontains="pend").first()
-        if pend_sit:
-            Demanda.objects.filter(pk=instance.demanda_id).update(
-                situacao_id=pend_sit.pk
+    instance._loaded_resolvida = now
+    if was == now:
+        return
+    if now:
+        alvo = _situacao_pk("execucao")
+        campos = {"situacao_id": alvo, "data_fechamento": None}
+    else:
+        alvo = _situacao_pk("pendente")
+        campos = {"situacao_id": alvo}
+    corrigir_resolvido_em = (
+        update_fields is not None and "resolvido_em" not in update_fields
+    )
+    # Transação só quando há duas gravações a manter juntas; com uma só, o
+    # atomic() apenas somaria BEGIN/COMMIT
+    juntas = corrigir_resolvido_em and alvo
+    with transaction.atomic() if juntas else nullcontext():
+        if corrigir_resolvido_em:
+            Pendencia.objects.filter(pk=instance.pk).update(
+                resolvido_em=instance.resolvido_em
             )
+        if alvo:
+            Demanda.objects.filter(pk=instance.demanda_id).update(**campos)
+
+
+# Chave do resumo (totais) exibido no painel de demandas do admin
+RESUMO_CACHE_KEY = "demanda_dashboard"
+
+# Versão dos dados do dashboard (Kanban e gráficos); faz parte da chave do
+# cache, então incrementá-la descarta o contexto anterior
+DASHBOARD_VERSAO_KEY = "dashboard_versao"
+
+
+def _limpar_caches_dashboard():
+    cache.delete(RESUMO_CACHE_KEY)
+    try:
+        cache.incr(DASHBOARD_VERSAO_KEY)
+    except ValueError:
+        cache.set(DASHBOARD_VERSAO_KEY, 1, None)
+
+
+def invalidar_dashboard():
+    # Só após o commit, para nenhuma leitura concorrente guardar dados antigos
+    transaction.on_commit(_limpar_caches_dashboard)
+
+
+# Registrado depois de pendencia_post_save, que também altera a demanda.
+# Tema e User entram porque o dashboard mostra o nome do tema e do responsável.
+@receiver([post_save, post_delete], sender=Demanda)
+@receiver([post_save, post_delete], sender=Situacao)
+@receiver([post_save, post_delete], sender=Pendencia)
+@receiver([post_save, post_delete], sender=Tema)
+@receiver([post_save, post_delete], sender=User)
+def dashboard_changed(sender, update_fields=None, **kwargs):
+    # O login só grava last_login, que o dashboard não exibe
+    if update_fields is not None and set(update_fields) <= {"last_login"}:
+        return
+    invalidar_dashboard()
@@ -1,3 +1,57 @@
 from django.test import TestCase
 
-# Create your tests here.
+from .models import Demanda, Pendencia, Situacao
+
+
+class PendenciaSinaisTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.pendente = Situacao.objects.create(nome="Pendente", pendente=True)
+        cls.execucao = Situacao.objects.create(nome="Em execução", execucao=True)
+        cls.demanda = Demanda.objects.create(titulo="d", situacao=cls.pendente)
+
+    def test_resolver_move_demanda_para_execucao(self):
+        p = Pendencia.objects.create(demanda=self.demanda, descricao="x")
+        p = Pendencia.objects.get(pk=p.pk)
+        p.resolvida = True
+        p.save()
+
+        p.refresh_from_db()
+        self.demanda.refresh_from_db()
+        self.assertIsNotNone(p.resolvido_em)
+        self.assertEqual(self.demanda.situacao_id, self.execucao.pk)
+
+    def test_reabrir_volta_demanda_para_pendente(self):
+        p = Pendencia.objects.create(demanda=self.demanda, descricao="x")
+        p.resolvida = True
+        p.save()
+        p.resolvida = False
+        p.save()
+
+        p.refresh_from_db()
+        self.demanda.refresh_from_db()
+        self.assertIsNone(p.resolvido_em)
+        self.assertEqual(self.demanda.situacao_id, self.pendente.pk)
+
+    def test_refresh_parcial_nao_esconde_mudanca_de_resolvida(self):
+        p = Pendencia.objects.create(demanda=self.demanda, descricao="x")
+        p = Pendencia.objects.get(pk=p.pk)
+        p.resolvida = True
+        p.refresh_from_db(fields=["descricao"])
+        p.save()
+
+        p.refresh_from_db()
+        self.demanda.refresh_from_db()
+        self.assertTrue(p.resolvida)
+        self.assertIsNotNone(p.resolvido_em)
+        self.assertEqual(self.demanda.situacao_id, self.execucao.pk)
+
+    def test_update_fields_sem_resolvido_em_ainda_grava_data(self):
+        p = Pendencia.objects.create(demanda=self.demanda, descricao="x")
+        p.resolvida = True
+        p.save(update_fields=["resolvida"])
+
+        p.refresh_from_db()
+        self.demanda.refresh_from_db()
+        self.assertIsNotNone(p.resolvido_em)
+        self.assertEqual(self.demanda.situacao_id, self.execucao.pk)
@@ -1,10 +1,43 @@
-from django.db.models import Count
+from collections import Counter, defaultdict, namedtuple
+
+from django.contrib.auth.decorators import permission_required
+from django.core.cache import cache
+from django.core.paginator import Paginator
+from django.db import transaction
+from django.db.models import Case, CharField, Count, Q, Value, When
 from django.shortcuts import get_object_or_404, redirect, render
 from django.urls import reverse
 from django.utils import timezone
+from django.utils.http import url_has_allowed_host_and_scheme
+from django.views.decorators.http import require_POST
+from simple_history.utils import bulk_update_with_history
 
 from .forms import UploadForm
-from .models import AnexoDemanda, Demanda, Pendencia, Situacao
+from .models import (
+    DASHBOARD_VERSAO_KEY,
+    AnexoDemanda,
+    Demanda,
+    Pendencia,
+    Situacao,
+    invalidar_dashboard,
+)
+
+# Ordem das colunas do Kanban (nomes já em minúsculas)
+ORDEM_SITUACOES = ("backlog", "priorizada", "em execução", "no farol", "finalizado")
+
+# Cabeçalho de coluna do Kanban; só os campos que o template usa
+SituacaoColuna = namedtuple("SituacaoColuna", "id nome cor_hex")
+
+# Demanda como o dashboard a exibe. O cache guarda só estes valores simples,
+# não instâncias de modelo.
+DemandaLinha = namedtuple(
+    "DemandaLinha",
+    "id titulo data_prazo situacao_id situacao_nome situacao_cor tema_id tema "
+    "responsavel responsavel_nome status_prazo cor_prazo pend_abertas",
+)
+
+# Contexto montado do dashboard, junto da versão/dia em que foi montado
+DASHBOARD_CONTEXTO_KEY = "dashboard_contexto"
 
 
 def upload_arquivos(request, demanda_id=None):
@@ -26,67 +59,116 @@ def upload_arquivos(request, demanda_id=None):
 
 
 def dashboard_view(request):
-    SENHA_MESTRE = "hub123"
-    if "logout" in request.GET:
-        request.session["auth_dashboard"] = False
-        return redirect("dashboard")
-    if request.method == "POST":
-        if request.POST.get("password") == SENHA_MESTRE:
-            request.session["auth_dashboard"] = True
-        else:
-            return render(
-                request, "core/login_dashboard.html", {"error": "Senha incorreta!"}
-            )
-
-    if not request.session.get("auth_dashboard"):
-        return render(request, "core/login_dashboard.html")
-
+    # A senha do dashboard é verificada em DashboardAuthMiddleware
     hoje = timezone.now().date()
-    todas_demandas = (
-        Demanda.objects.all()
-        .select_related("situacao", "responsavel")
-        .order_by("-criado_em")
+    # Uma única entrada no cache, válida para a versão e o dia em que foi
+    # montada; a versão muda a cada gravação de demanda/situação/pendência
+    guardado = cache.get_many([DASHBOARD_VERSAO_KEY, DASHBOARD_CONTEXTO_KEY])
+    versao = (guardado.get(DASHBOARD_VERSAO_KEY, 0), hoje)
+    contexto_guardado = guardado.get(DASHBOARD_CONTEXTO_KEY)
+    if contexto_guardado and contexto_guardado[0] == versao:
+        context = contexto_guardado[1]
+    else:
+        context = _contexto_dashboard(hoje)
+        cache.set(DASHBOARD_CONTEXTO_KEY, (versao, context), 300)
+    # O Kanban usa todas as demandas; a tabela é paginada
+    page_obj = Paginator(context["demandas"], 50).get_page(request.GET.get("page"))
+    return render(request, "core/dashboard.html", {**context, "page_obj": page_obj})
+
+
+def _contexto_dashboard(hoje):
+    linhas = (
+        Demanda.objects.annotate(
+            status_prazo=Case(
+                When(data_prazo__isnull=True, then=Value("Sem Prazo")),
+                When(data_prazo__lt=hoje, then=Value("Atrasado")),
+                default=Value("No Prazo"),
+                output_field=CharField(),
+            ),
+            cor_prazo=Case(
+                When(data_prazo__isnull=True, then=Value("secondary")),
+                When(data_prazo__lt=hoje, then=Value("danger")),
+                default=Value("success"),
+                output_field=CharField(),
+            ),
+            pend_abertas=Count("pendencias", filter=Q(pendencias__resolvida=False)),
+        )
+        # Só as colunas usadas pelo Kanban, tabela e gráficos
+        .values_list(
+            "id",
+            "titulo",
+            "data_prazo",
+            "situacao_id",
+            "situacao__nome",
+            "situacao__cor_hex",
+            "tema_id",
+            "tema__nome",
+            "responsavel__username",
+            "responsavel__first_name",
+            "responsavel__last_name",
+            "status_prazo",
+            "cor_prazo",
+            "pend_abertas",
+        ).order_by("-criado_em")
     )
+    todas_demandas = []
+    for valores in linhas:
+        username, first_name, last_name = valores[8:11]
+        # Equivalente a User.get_full_name(), com o username como alternativa
+        nome_completo = f"{first_name or ''} {last_name or ''}".strip()
+        todas_demandas.append(
+            DemandaLinha(
+                *valores[:8], username, nome_completo or username, *valores[11:]
+            )
+        )
 
-    for d in todas_demandas:
-        if not d.data_prazo:
-            d.status_prazo, d.cor_prazo = "Sem Prazo", "secondary"
-        elif d.data_prazo < hoje:
-            d.status_prazo, d.cor_prazo = "Atrasado", "danger"
-        else:
-            d.status_prazo, d.cor_prazo = "No Prazo", "success"
-
-    desired_order = ["Backlog", "Priorizada", "Em execução", "No Farol", "Finalizado"]
-    all_situacoes = list(Situacao.objects.all())
-    situacoes = [
-        s
-        for name in desired_order
-        for s in all_situacoes
-        if s.nome.lower() == name.lower()
+    all_situacoes = [
+        SituacaoColuna(*valores)
+        for valores in Situacao.objects.values_list("id", "nome", "cor_hex")
     ]
-    situacoes += [s for s in all_situacoes if s not in situacoes]
+    by_name = {s.nome.lower(): s for s in all_situacoes if s.nome}
+    situacoes = [by_name[name] for name in ORDEM_SITUACOES if name in by_name]
+    escolhidas = {s.id for s in situacoes}
+    situacoes.extend(s for s in all_situacoes if s.id not in escolhidas)
 
-    kanban_data = {
-        sit: [d for d in todas_demandas if d.situacao_id == sit.id] for sit in situacoes
-    }
-    sit_data = Demanda.objects.values("situacao__nome", "situacao__cor_hex").annotate(
-        total=Count("id")
-    )
-    tema_data = Demanda.objects.values("tema").annotate(total=Count("id"))
+    # Distribui as demandas por situação em uma única passada
+    buckets = defaultdict(list)
+    for d in todas_demandas:
+        buckets[d.situacao_id].append(d)
+    kanban_data = {sit: buckets.get(sit.id, []) for sit in situacoes}
+    # Totais dos gráficos a partir das demandas já carregadas
+    sit_data = Counter((d.situacao_nome, d.situacao_cor) for d in todas_demandas)
+    tema_data = Counter(d.tema_id for d in todas_demandas)
 
     context = {
         "kanban_data": kanban_data,
         "demandas": todas_demandas,
         "hoje": hoje,
-        "labels_situacao": [
-            item["situacao__nome"] or "Sem Situação" for item in sit_data
-        ],
-        "counts_situacao": [item["total"] for item in sit_data],
-        "cores_situacao": [item["situacao__cor_hex"] or "#bdc3c7" for item in sit_data],
-        "labels_tema": [item["tema"] for item in tema_data],
-        "counts_tema": [item["total"] for item in tema_data],
+        "labels_situacao": [nome or "Sem Situação" for nome, _ in sit_data],
+        "counts_situacao": list(sit_data.values()),
+        "cores_situacao": [cor or "#bdc3c7" for _, cor in sit_data],
+        "labels_tema": list(tema_data),
+        "counts_tema": list(tema_data.values()),
     }
-    return render(request, "core/dashboard.html", context)
+    return context
+
+
+def _redirecionar_next(request):
+    # Só segue ``next`` se apontar para este mesmo host
+    destino = request.POST.get("next") or request.GET.get("next")
+    if destino and url_has_allowed_host_and_scheme(
+        destino, allowed_hosts={request.get_host()}, require_https=request.is_secure()
+    ):
+        return redirect(destino)
+    return redirect("dashboard")
+
+
+def _mudar_situacao(demanda, situacao):
+    # Sem mudança real não há UPDATE nem nova linha de histórico
+    if demanda.situacao_id == situacao.pk:
+        return
+    demanda.situacao = situacao
+    demanda.save(update_fields=["situacao", "atualizado_em"])
 
 
 def alterar_status_view(request, pk, situacao_id):
@@ -96,8 +178,7 @@ def alterar_status_view(request, pk, situacao_id):
     if target.pendente:
         if request.method == "POST":
             desc = request.POST.get("pendencia_descricao", "").strip()
-            d.situacao = target
-            d.save()
+            _mudar_situacao(d, target)
             if desc:
                 Pendencia.objects.create(
                     demanda=d, descricao=desc, criado_por=request.user, resolvida=False
@@ -108,17 +189,62 @@ def alterar_status_view(request, pk, situacao_id):
         return render(
             request,
             "core/pendencia_form.html",
-            {"demanda": d, "target": target, "action_url": request.path},
+            {"demanda": d, "target": target, "action_url": request.get_full_path()},
         )
 
-    d.situacao = target
-    d.save()
+    _mudar_situacao(d, target)
 
-    Pendencia.objects.filter(demanda=d, resolvida=False).update(
+    resolvidas = Pendencia.objects.filter(demanda=d, resolvida=False).update(
         resolvida=True, resolvido_em=timezone.now(), resolvido_por=request.user
     )
+    if resolvidas:
+        # update() não dispara sinais; o contador de pendências do Kanban muda
+        invalidar_dashboard()
+
+    return _redirecionar_next(request)
+
+
+@require_POST
+@permission_required("core.change_demanda", raise_exception=True)
+def alterar_status_lote_view(request, situacao_id):
+    # Aplica a mesma situação às demandas enviadas em ``ids`` de uma só vez
+    target = get_object_or_404(Situacao, pk=situacao_id)
+    ids = [int(i) for i in request.POST.getlist("ids") if i.isdigit()]
+    # Instâncias completas: o histórico guarda uma cópia de cada demanda
+    demandas = list(Demanda.objects.filter(pk__in=ids))
+    if demandas:
+        ids = [d.pk for d in demandas]
+        agora = timezone.now()
+        # Como em _mudar_situacao, só quem muda de situação gera histórico
+        mudadas = [d for d in demandas if d.situacao_id != target.pk]
+        for d in mudadas:
+            d.situacao = target
+            d.atualizado_em = agora
+        with transaction.atomic():
+            if mudadas:
+                bulk_update_with_history(
+                    mudadas,
+                    Demanda,
+                    ["situacao", "atualizado_em"],
+                    default_user=request.user,
+                )
+            if target.pendente:
+                desc = request.POST.get("pendencia_descricao", "").strip()
+                if desc:
+                    Pendencia.objects.bulk_create(
+                        Pendencia(
+                            demanda_id=pk, descricao=desc, criado_por=request.user
+                        )
+                        for pk in ids
+                    )
+            else:
+                Pendencia.objects.filter(demanda_id__in=ids, resolvida=False).update(
+                    resolvida=True, resolvido_em=agora, resolvido_por=request.user
+                )
+        # bulk_update()/bulk_create()/update() não disparam os sinais
+        invalidar_dashboard()
 
-    return redirect(request.META.get("HTTP_REFERER", "dashboard"))
+    return _redirecionar_next(request)
 
 
 def criar_subatividade_view(request, pk):
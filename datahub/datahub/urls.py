@@ -1,4 +1,9 @@
-from core.views import alterar_status_view, criar_subatividade_view, dashboard_view
+from core.views import (
+    alterar_status_lote_view,
+    alterar_status_view,
+    criar_subatividade_view,
+    dashboard_view,
+)
 from django.conf import settings
 from django.conf.urls.static import static
 from django.contrib import admin
@@ -6,6 +11,11 @@ from django.urls import path
 
 urlpatterns = [
     # Coloque as ações ANTES do admin ou com um nome bem específico
+    path(
+        "acoes/status/lote/<int:situacao_id>/",
+        alterar_status_lote_view,
+        name="alterar_status_lote",
+    ),
     path(
         "acoes/status/<int:pk>/<int:situacao_id>/",
         alterar_status_view,